@@ -21,40 +21,124 @@ Usage (local spec mode):
 """
 
 import argparse
+import gzip
+import hashlib
 import json
 import os
+import shutil
 import subprocess
 import sys
-import urllib.error
-import urllib.request
+import threading
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import boto3
+except ImportError:  # optional: falls back to the AWS CLI
+    boto3 = None
 
 
 POSTMAN_API_BASE = "https://api.getpostman.com"
+VARIANT_CACHE_PATH = os.path.expanduser("~/.postman_spec_variant")
+SPEC_HASH_CACHE_PATH = os.path.expanduser("~/.postman_spec_hashes.json")
+GZIP_MIN_BYTES = 1024
+
+# Flipped when the API turns out not to accept gzip-encoded request bodies.
+_gzip_rejected = False
+# Set once a gzip body has been accepted, or the one-off 400 probe below has been spent.
+_gzip_settled = False
+_gzip_lock = threading.Lock()
+
+# One pooled session for every Postman call so keep-alive reuses the TCP+TLS connection.
+# Everything targets a single host, and the widest fan-out is the update_spec variants,
+# so the pool is sized to that instead of urllib3's per-host defaults.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=3,
+        max_retries=Retry(
+            total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504], raise_on_status=False
+        ),
+    ),
+)
+_SESSION.headers.update({"Content-Type": "application/json", "Accept": "application/json"})
+
+
+class HTTPStatusError(RuntimeError):
+    """An HTTP error response from the Postman API."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _dumps(body: dict) -> bytes:
+    """Serialize a request body straight to UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.dumps(body)
+    return json.dumps(body).encode("utf-8")
 
 
 def http_json(method: str, url: str, api_key: str, body: dict | None = None) -> dict:
     """Make an HTTP request and return JSON response."""
-    headers = {
-        "X-Api-Key": api_key,
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
-    data = None
-    if body is not None:
-        data = json.dumps(body).encode("utf-8")
-
-    req = urllib.request.Request(url, data=data, headers=headers, method=method)
+    global _gzip_rejected, _gzip_settled
+    data = _dumps(body) if body is not None else None
+    headers = {"X-Api-Key": api_key}
+    resp = None
+    if data is not None and len(data) > GZIP_MIN_BYTES and not _gzip_rejected:
+        resp = _SESSION.request(
+            method,
+            url,
+            data=gzip.compress(data, compresslevel=6),
+            headers={**headers, "Content-Encoding": "gzip"},
+            timeout=60,
+        )
+        probe = False
+        with _gzip_lock:
+            if resp.ok:
+                _gzip_settled = True
+            elif resp.status_code == 400 and not _gzip_settled:
+                # Servers that don't decode Content-Encoding usually answer 400, which is also
+                # how a rejected payload variant looks. Until gzip is known to work, spend a
+                # single uncompressed retry to tell the two apart; after that 400 means payload.
+                _gzip_settled = probe = True
+        if resp.status_code == 415:
+            _gzip_rejected = True
+            resp = _SESSION.request(method, url, data=data, headers=headers, timeout=60)
+        elif probe:
+            resp = _SESSION.request(method, url, data=data, headers=headers, timeout=60)
+            _gzip_rejected = resp.ok
+    if resp is None:
+        resp = _SESSION.request(method, url, data=data, headers=headers, timeout=60)
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            raw = resp.read().decode("utf-8")
-            return json.loads(raw) if raw else {}
-    except urllib.error.HTTPError as e:
-        raw = e.read().decode("utf-8") if e.fp else ""
-        raise RuntimeError(f"HTTP {e.code} calling {url}: {raw}") from e
+        resp.raise_for_status()
+    except requests.HTTPError as e:
+        raise HTTPStatusError(resp.status_code, f"HTTP {resp.status_code} calling {url}: {resp.text}") from e
+    return resp.json() if resp.content else {}
+
 
+def aws_export_openapi(region: str, rest_api_id: str, stage_name: str, out_path: str) -> str:
+    """Export OpenAPI 3.0 spec from AWS API Gateway to out_path and return its text."""
+    if boto3 is not None:
+        print(f"[..] Exporting via boto3: apigateway.get_export({rest_api_id}, {stage_name}, oas30)")
+        client = boto3.client("apigateway", region_name=region)
+        resp = client.get_export(restApiId=rest_api_id, stageName=stage_name, exportType="oas30")
+        raw = resp["body"].read()
+        with open(out_path, "wb") as f:
+            f.write(raw)
+        return raw.decode("utf-8")
 
-def aws_export_openapi(region: str, rest_api_id: str, stage_name: str, out_path: str) -> None:
-    """Export OpenAPI 3.0 spec from AWS API Gateway."""
     cmd = [
         "aws",
         "apigateway",
@@ -71,11 +155,21 @@ def aws_export_openapi(region: str, rest_api_id: str, stage_name: str, out_path:
     ]
     print(f"[..] Running: {' '.join(cmd)}")
     subprocess.run(cmd, check=True)
+    with open(out_path, "r", encoding="utf-8") as f:
+        return f.read()
 
 
-def list_specs(workspace_id: str, api_key: str) -> list[dict]:
-    """List all specs in a workspace."""
-    url = f"{POSTMAN_API_BASE}/specs?workspaceId={workspace_id}"
+def list_specs(workspace_id: str, api_key: str, name: str | None = None) -> list[dict]:
+    """List specs in a workspace, asking the API to filter by name when given."""
+    url = f"{POSTMAN_API_BASE}/specs?{urllib.parse.urlencode({'workspaceId': workspace_id})}"
+    if name is not None:
+        # `name` is an undocumented filter; if the API rejects it, list unfiltered instead.
+        try:
+            resp = http_json("GET", f"{url}&{urllib.parse.urlencode({'name': name})}", api_key)
+            return resp.get("specs", [])
+        except HTTPStatusError as e:
+            if not 400 <= e.status < 500:
+                raise
     resp = http_json("GET", url, api_key)
     return resp.get("specs", [])
 
@@ -89,48 +183,152 @@ def _extract_spec_id(resp: dict) -> str:
     raise RuntimeError(f"Unexpected spec response: {resp}")
 
 
+# Spec Hub payload shapes, tried in order by create_spec/update_spec. Bodies are only
+# built (and serialized) for the variant actually being sent.
+_SPEC_PAYLOAD_VARIANTS = [
+    # Variant A (common in examples)
+    lambda name, spec_yaml: {"name": name, "type": "openapi3", "language": "yaml", "schema": spec_yaml},
+    # Variant B (seen in some Postman request templates)
+    lambda name, spec_yaml: {
+        "specName": name,
+        "specType": "openapi3",
+        "filePath": f"{name}.yaml",
+        "content": spec_yaml,
+    },
+    # Variant C (wrapped)
+    lambda name, spec_yaml: {
+        "spec": {"name": name, "type": "openapi3", "language": "yaml", "schema": spec_yaml}
+    },
+]
+
+
+def _load_variant_cache() -> dict:
+    """Load the payload variants that last worked against this API base."""
+    try:
+        with open(VARIANT_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    entry = cache.get(POSTMAN_API_BASE) if isinstance(cache, dict) else None
+    return entry if isinstance(entry, dict) else {}
+
+
+def _save_variant_cache(key: str, idx: int) -> None:
+    """Remember which payload variant worked for create/update (best effort)."""
+    try:
+        with open(VARIANT_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if not isinstance(cache, dict):
+            cache = {}
+    except (OSError, ValueError):
+        cache = {}
+    entry = cache.setdefault(POSTMAN_API_BASE, {})
+    if entry.get(key) == idx:
+        return
+    entry[key] = idx
+    try:
+        with open(VARIANT_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+
+def _variant_order(cached, count: int) -> list[int]:
+    """Variant indices to try, with the cached winner (if any) first."""
+    order = list(range(count))
+    if isinstance(cached, int) and cached in order:
+        order.remove(cached)
+        order.insert(0, cached)
+    return order
+
+
 def create_spec(workspace_id: str, api_key: str, name: str, spec_yaml: str) -> str:
     """Create a new spec in Spec Hub."""
     url = f"{POSTMAN_API_BASE}/specs?workspaceId={workspace_id}"
-    payload_variants = [
-        # Variant A (common in examples)
-        {"name": name, "type": "openapi3", "language": "yaml", "schema": spec_yaml},
-        # Variant B (seen in some Postman request templates)
-        {"specName": name, "specType": "openapi3", "filePath": f"{name}.yaml", "content": spec_yaml},
-        # Variant C (wrapped)
-        {"spec": {"name": name, "type": "openapi3", "language": "yaml", "schema": spec_yaml}},
-    ]
-
     last_err = None
-    for body in payload_variants:
+    for idx in _variant_order(_load_variant_cache().get("create"), len(_SPEC_PAYLOAD_VARIANTS)):
         try:
-            resp = http_json("POST", url, api_key, body=body)
-            return _extract_spec_id(resp)
+            resp = http_json("POST", url, api_key, body=_SPEC_PAYLOAD_VARIANTS[idx](name, spec_yaml))
+            spec_id = _extract_spec_id(resp)
         except Exception as e:
             last_err = e
             continue
-    raise RuntimeError(f"Failed to create spec (tried {len(payload_variants)} payloads): {last_err}") from last_err
+        _save_variant_cache("create", idx)
+        return spec_id
+    raise RuntimeError(f"Failed to create spec (tried {len(_SPEC_PAYLOAD_VARIANTS)} payloads): {last_err}") from last_err
 
 
 def update_spec(spec_id: str, api_key: str, name: str, spec_yaml: str) -> None:
     """Update an existing spec in Spec Hub."""
     url = f"{POSTMAN_API_BASE}/specs/{spec_id}"
-    payload_variants = [
-        {"name": name, "type": "openapi3", "language": "yaml", "schema": spec_yaml},
-        {"specName": name, "specType": "openapi3", "filePath": f"{name}.yaml", "content": spec_yaml},
-        {"spec": {"name": name, "type": "openapi3", "language": "yaml", "schema": spec_yaml}},
-    ]
+    cached = _load_variant_cache().get("update")
+    order = _variant_order(cached, len(_SPEC_PAYLOAD_VARIANTS))
     last_err = None
-    for body in payload_variants:
+    if order[0] == cached:
+        # A known-good shape goes out alone; the fan-out below is only for rediscovery,
+        # so only a 4xx rejection of that shape falls through. Transient errors propagate.
+        idx = order.pop(0)
         try:
-            http_json("PUT", url, api_key, body=body)
+            http_json("PUT", url, api_key, body=_SPEC_PAYLOAD_VARIANTS[idx](name, spec_yaml))
             return
-        except Exception as e:
+        except HTTPStatusError as e:
+            if not 400 <= e.status < 500:
+                raise
             last_err = e
-            continue
+
+    # PUT is idempotent, so fire every variant at once instead of paying one RTT per rejection.
+    # A short stagger lets Variant A win uncontested when it answers quickly.
+    ex = ThreadPoolExecutor(max_workers=len(_SPEC_PAYLOAD_VARIANTS))
+    try:
+        futures = {}
+        for idx in order:
+            if futures:
+                wait([f for f in futures if not f.done()], timeout=0.05, return_when=FIRST_COMPLETED)
+                if any(f.done() and f.exception() is None for f in futures):
+                    break
+            body = _SPEC_PAYLOAD_VARIANTS[idx](name, spec_yaml)
+            futures[ex.submit(http_json, "PUT", url, api_key, body=body)] = idx
+        # Pick the first success in preference order, not whichever response lands first.
+        for fut, idx in futures.items():
+            try:
+                fut.result()
+            except Exception as e:
+                last_err = e
+                continue
+            _save_variant_cache("update", idx)
+            return
+    finally:
+        # Let in-flight PUTs finish so none land after Step 3 or the session is closed.
+        ex.shutdown(wait=True)
     raise RuntimeError(f"Failed to update spec {spec_id}: {last_err}") from last_err
 
 
+def _spec_digest(spec_yaml: str) -> str:
+    """Content hash used to detect an unchanged spec."""
+    return hashlib.blake2b(spec_yaml.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _load_spec_hashes() -> dict:
+    """Load {spec_id: digest} recorded after the last successful sync."""
+    try:
+        with open(SPEC_HASH_CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_spec_hash(spec_id: str, digest: str) -> None:
+    """Record the digest of the spec just synced (best effort)."""
+    cache = _load_spec_hashes()
+    cache[spec_id] = digest
+    try:
+        with open(SPEC_HASH_CACHE_PATH, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+
 def generate_collection_from_spec(spec_id: str, api_key: str) -> dict:
     """Trigger collection generation from a spec."""
     url = f"{POSTMAN_API_BASE}/specs/{spec_id}/generations/collection"
@@ -138,6 +336,13 @@ def generate_collection_from_spec(spec_id: str, api_key: str) -> dict:
 
 
 def main() -> int:
+    try:
+        return _run()
+    finally:
+        _SESSION.close()
+
+
+def _run() -> int:
     parser = argparse.ArgumentParser(
         description="Export OpenAPI from API Gateway and sync to Postman Spec Hub"
     )
@@ -155,6 +360,11 @@ def main() -> int:
         help="Name for the spec in Spec Hub",
     )
     parser.add_argument("--out", default="openapi.yaml", help="Output file (written in both modes)")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-sync and regenerate even if the spec is unchanged since the last run",
+    )
     args = parser.parse_args()
 
     api_key = os.environ.get("POSTMAN_API_KEY")
@@ -162,22 +372,7 @@ def main() -> int:
         print("❌ Missing POSTMAN_API_KEY environment variable", file=sys.stderr)
         return 2
 
-    # Step 1: Get spec (AWS export OR local fallback)
-    print("=" * 60)
-    if args.local_spec:
-        print("Step 1: Load OpenAPI from local file")
-        print("=" * 60)
-        with open(args.local_spec, "r", encoding="utf-8") as f:
-            spec_yaml = f.read()
-        if args.local_spec != args.out:
-            with open(args.out, "w", encoding="utf-8") as out:
-                out.write(spec_yaml)
-        print(f"✅ Loaded spec → {args.local_spec} ({len(spec_yaml)} chars)")
-        if args.local_spec != args.out:
-            print(f"✅ Wrote copy → {args.out}")
-    else:
-        print("Step 1: Export OpenAPI from API Gateway")
-        print("=" * 60)
+    if not args.local_spec:
         missing = [
             name
             for name, val in [
@@ -194,18 +389,51 @@ def main() -> int:
                 + " (or provide --local-spec)"
             )
 
-        aws_export_openapi(args.region, args.rest_api_id, args.stage_name, args.out)
-        with open(args.out, "r", encoding="utf-8") as f:
-            spec_yaml = f.read()
-        print(f"✅ Exported spec → {args.out} ({len(spec_yaml)} chars)")
+    # list_specs doesn't depend on the spec contents, so overlap its round-trip with Step 1.
+    # It also doubles as the connection warm-up: DNS, TCP and TLS for the API host are done
+    # while the spec is exported/copied, and later calls reuse the pooled keep-alive socket.
+    lookup = ThreadPoolExecutor(max_workers=1)
+    specs_future = lookup.submit(list_specs, args.workspace_id, api_key, args.spec_name)
+    lookup.shutdown(wait=False)
+
+    # Step 1: Get spec (AWS export OR local fallback)
+    print("=" * 60)
+    try:
+        if args.local_spec:
+            print("Step 1: Load OpenAPI from local file")
+            print("=" * 60)
+            with open(args.local_spec, "r", encoding="utf-8") as f:
+                spec_yaml = f.read()
+            print(f"✅ Loaded spec → {args.local_spec} ({len(spec_yaml)} chars)")
+            if not (os.path.exists(args.out) and os.path.samefile(args.local_spec, args.out)):
+                shutil.copyfile(args.local_spec, args.out)
+                print(f"✅ Wrote copy → {args.out}")
+        else:
+            print("Step 1: Export OpenAPI from API Gateway")
+            print("=" * 60)
+            spec_yaml = aws_export_openapi(args.region, args.rest_api_id, args.stage_name, args.out)
+            print(f"✅ Exported spec → {args.out} ({len(spec_yaml)} chars)")
+    except BaseException:
+        # Don't let main() close the session under an in-flight lookup.
+        specs_future.cancel()
+        wait([specs_future])
+        raise
 
     # Step 2: Upsert to Spec Hub
     print("\n" + "=" * 60)
     print("Step 2: Upsert spec to Postman Spec Hub")
     print("=" * 60)
-    existing = [s for s in list_specs(args.workspace_id, api_key) if s.get("name") == args.spec_name]
-    if existing and existing[0].get("id"):
-        spec_id = existing[0]["id"]
+    # The name filter is only a hint to the API, so the exact match is still checked here.
+    existing = next(
+        (s for s in specs_future.result() if s.get("name") == args.spec_name),
+        None,
+    )
+    digest = _spec_digest(spec_yaml)
+    if existing and existing.get("id"):
+        spec_id = existing["id"]
+        if not args.force and _load_spec_hashes().get(spec_id) == digest:
+            print(f"⏭️  Skipped: spec unchanged (id={spec_id}); pass --force to re-sync anyway")
+            return 0
         update_spec(spec_id, api_key, args.spec_name, spec_yaml)
         print(f"✅ Updated spec: {args.spec_name} (id={spec_id})")
     else:
@@ -218,6 +446,7 @@ def main() -> int:
     print("=" * 60)
     gen = generate_collection_from_spec(spec_id, api_key)
     print(f"✅ Generation request completed (response keys: {sorted(gen.keys())})")
+    _save_spec_hash(spec_id, digest)
 
     print("\n" + "=" * 60)
     print("✅ DONE - Ingestion complete")